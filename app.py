@@ -5,11 +5,26 @@ import json
 from datetime import datetime, timedelta
 from statsmodels.tsa.statespace.sarimax import SARIMAX
 from statsmodels.tsa.stattools import adfuller
+from order_cube import build_order_cube, dataset_version, sku_abc_class, SKU_CLASSES, ORDER_TYPES
+from forecast_state import ForecastStateStore, weekly_sales_series
+from data_validation import load_validated_orders
+from inventory_planning import weekly_demand_matrix, model_residuals, plan_inventory, summarize_by_class
+from workload import workload_matrices, staffing_plan
 
 app = Flask(__name__)
 
 # 全局变量存储数据，避免重复加载
 global_data = None
+# 预聚合订单立方体，每个数据集版本只构建一次
+global_cube = None
+# SKU预测模型状态，新数据到达时热启动更新
+forecast_store = ForecastStateStore()
+# SKU × 周需求矩阵，库存计划计算用
+global_demand = None
+# 订单类型 × 日期 × 小时 工作量矩阵，人力排班用
+global_workload = None
+# 未筛选的仪表盘数据（每个数据集只计算一次）
+global_summary = None
 
 def convert_to_native_types(obj):
     """将numpy类型转换为Python原生类型"""
@@ -30,30 +45,16 @@ def convert_to_native_types(obj):
 def load_and_merge_data():
     """加载并合并12个月的订单数据"""
     excel_file = r'c:\Coding\!completed_project\251230_order-analysis\案例-附件1：订单数据.xlsx'
-    sheet_names = ['1月', '2月', '3月', '4月', '5月', '6月', '7月', '8月', '9月', '10月', '11月', '12月']
     
-    # 合并所有月份数据
-    all_data = []
-    for sheet in sheet_names:
-        try:
-            df = pd.read_excel(excel_file, sheet_name=sheet)
-            all_data.append(df)
-        except Exception as e:
-            print(f"无法读取工作表 {sheet}: {e}")
-    
-    if not all_data:
-        raise ValueError("没有成功读取任何数据")
-    
-    merged_df = pd.concat(all_data, ignore_index=True)
+    # 分块读取并校验，不合格行写入隔离文件而不是被静默丢弃
+    merged_df, _ = load_validated_orders(excel_file)
     print(f"合并后数据形状: {merged_df.shape}")
     print(f"数据列名: {merged_df.columns.tolist()}")
     
-    # 数据清洗
-    merged_df = merged_df.dropna()
-    merged_df['订单编号'] = merged_df['订单编号'].astype(int)
-    merged_df['SKU编号'] = merged_df['SKU编号'].astype(int)
-    merged_df['订货量'] = merged_df['订货量'].astype(int)
-    
+    return prepare_order_data(merged_df)
+
+def prepare_order_data(merged_df):
+    """为已校验的订单明细添加时间特征、订单类型和分拣时间"""
     # 添加时间特征
     merged_df['月份'] = merged_df['时间'].dt.month
     merged_df['季度'] = merged_df['时间'].dt.quarter
@@ -226,6 +227,122 @@ def load_data():
     
     return convert_to_native_types(result)
 
+# 未筛选的仪表盘数据
+def get_summary():
+    """获取未筛选的仪表盘数据，数据集变化时重新计算"""
+    global global_data, global_summary
+    
+    if global_data is None:
+        global_data = load_and_merge_data()
+    
+    if global_summary is None or global_summary['source'] is not global_data:
+        global_summary = {'source': global_data, 'data': load_data()}
+    
+    return global_summary['data']
+
+# 筛选条件不影响的字段：带筛选时这些字段仍返回全部数据的结果
+UNFILTERED_KEYS = ['sku_classes', 'customer_classes', 'eiq_data', 'top_skus', 'sorting_data',
+                   'overall_on_time_rate', 'total_orders', 'total_on_time']
+
+# 获取订单立方体
+def get_order_cube():
+    """获取订单立方体，每个数据集版本只构建一次"""
+    global global_data, global_cube
+    
+    if global_data is None:
+        global_data = load_and_merge_data()
+    
+    # 明细数据对象被替换时才计算版本号（避免每次请求都哈希全部数据）；
+    # 版本号不变（如重新加载了同一份数据）时沿用原立方体
+    if global_cube is None or global_cube.source is not global_data:
+        version = dataset_version(global_data)
+        if global_cube is None or global_cube.version != version:
+            global_cube = build_order_cube(global_data, version)
+        else:
+            global_cube.source = global_data
+    
+    return global_cube
+
+def parse_cube_filters(args):
+    """解析/data的筛选参数，参数不合法时抛出ValueError"""
+    filters = {}
+    
+    for key in ['month_start', 'month_end']:
+        value = args.get(key)
+        if value:
+            month = int(value)
+            if not 1 <= month <= 12:
+                raise ValueError(f'{key} 必须在1-12之间')
+            filters[key] = month
+    
+    customers = [c for value in args.getlist('customer') for c in value.split(',') if c]
+    if customers:
+        filters['customers'] = customers
+    
+    order_type = args.get('order_type')
+    if order_type:
+        if order_type not in ORDER_TYPES:
+            raise ValueError(f'order_type 必须是 {"/".join(ORDER_TYPES)}')
+        filters['order_type'] = order_type
+    
+    sku_classes = [c.upper() for value in args.getlist('sku_class') for c in value.split(',') if c]
+    if sku_classes:
+        if any(c not in SKU_CLASSES for c in sku_classes):
+            raise ValueError(f'sku_class 必须是 {",".join(SKU_CLASSES)}')
+        filters['sku_classes'] = sku_classes
+    
+    return filters
+
+# 库存计划（安全库存与再订货点）
+def inventory_plan(lead_time=2.0, lead_time_std=0.0, service_levels=None, sku_class=None, limit=100):
+    """对全部SKU向量化计算安全库存和再订货点"""
+    global global_data, global_demand
+    
+    if global_data is None:
+        global_data = load_and_merge_data()
+    
+    # 需求矩阵和ABC分类只在数据集变化时重新构建
+    if global_demand is None or global_demand['source'] is not global_data:
+        sku_ids, weeks, demand = weekly_demand_matrix(global_data)
+        global_demand = {
+            'source': global_data,
+            'sku_ids': sku_ids,
+            'weeks': weeks,
+            'demand': demand,
+            'classes': sku_abc_class(global_data).reindex(sku_ids).to_numpy()
+        }
+    
+    residuals = model_residuals(forecast_store, global_demand['sku_ids'], global_demand['weeks'])
+    plan = plan_inventory(global_demand['sku_ids'], global_demand['demand'], global_demand['classes'],
+                          residuals=residuals, lead_time=lead_time, lead_time_std=lead_time_std,
+                          service_levels=service_levels)
+    summary = summarize_by_class(plan)
+    
+    if sku_class:
+        plan = plan[plan['分类'] == sku_class]
+    plan = plan.sort_values('安全库存', ascending=False).head(limit)
+    
+    return convert_to_native_types({
+        'lead_time': lead_time,
+        'lead_time_std': lead_time_std,
+        'classes': {column: summary[column].tolist() for column in summary.columns},
+        'skus': {column: plan[column].tolist() for column in plan.columns}
+    })
+
+# 人力排班（星期几 × 小时工作量）
+def workload_plan(stat='mean', split=False, **assumptions):
+    """返回热力图所需的工作量矩阵和各时段所需拣货人数"""
+    global global_data, global_workload
+    
+    if global_data is None:
+        global_data = load_and_merge_data()
+    
+    # 工作量矩阵只在数据集变化时重新构建
+    if global_workload is None or global_workload['source'] is not global_data:
+        global_workload = {'source': global_data, 'matrices': workload_matrices(global_data)}
+    
+    return convert_to_native_types(staffing_plan(global_workload['matrices'], stat, split, **assumptions))
+
 # SARIMA销售预测
 def sarima_forecast(sku_id, forecast_weeks=52):
     """使用SARIMA模型对指定SKU进行销售预测"""
@@ -236,26 +353,17 @@ def sarima_forecast(sku_id, forecast_weeks=52):
     
     df = global_data
     
-    # 按周聚合SKU销售数据
-    sku_data = df[df['SKU编号'] == sku_id]
-    weekly_sales = sku_data.groupby(['年份', '周'])['订货量'].sum().reset_index()
+    # 按周聚合SKU销售数据（规则周序列，缺失周补0）
+    ts = weekly_sales_series(df, sku_id)
     
-    if weekly_sales.empty:
+    if ts is None:
         return {
             'error': f'没有找到SKU {sku_id} 的销售数据'
         }
     
-    # 创建日期索引
-    weekly_sales['日期'] = pd.to_datetime(weekly_sales['年份'].astype(str) + '-W' + weekly_sales['周'].astype(str) + '-1', format='%Y-W%U-%w')
-    weekly_sales = weekly_sales.sort_values('日期')
-    
-    # 转换为时间序列
-    ts = weekly_sales.set_index('日期')['订货量']
-    
     try:
-        # 拟合SARIMA模型
-        model = SARIMAX(ts, order=(1, 1, 1), seasonal_order=(1, 1, 1, 52))
-        model_fit = model.fit(disp=False)
+        # 拟合SARIMA模型：已有模型状态时热启动更新，否则冷启动拟合
+        model_fit, model_state = forecast_store.update(sku_id, ts)
         
         # 预测未来一年
         forecast = model_fit.forecast(steps=forecast_weeks)
@@ -266,7 +374,7 @@ def sarima_forecast(sku_id, forecast_weeks=52):
             history_dates = ts.index.strftime('%Y-%m-%d').tolist()
         else:
             # 如果索引不是DatetimeIndex，使用原始的日期列
-            history_dates = weekly_sales['日期'].dt.strftime('%Y-%m-%d').tolist()
+            history_dates = pd.to_datetime(ts.index).strftime('%Y-%m-%d').tolist()
         
         history_values = ts.values.tolist()
         
@@ -274,7 +382,7 @@ def sarima_forecast(sku_id, forecast_weeks=52):
             forecast_dates = forecast.index.strftime('%Y-%m-%d').tolist()
         else:
             # 生成未来日期
-            last_date = weekly_sales['日期'].max()
+            last_date = ts.index.max()
             forecast_dates = [(last_date + timedelta(weeks=i+1)).strftime('%Y-%m-%d') for i in range(forecast_weeks)]
         
         forecast_values = forecast.values.tolist()
@@ -292,6 +400,11 @@ def sarima_forecast(sku_id, forecast_weeks=52):
             'forecast': {
                 'dates': forecast_dates,
                 'values': forecast_values
+            },
+            'model': {
+                'mode': model_state['mode'],
+                'fit_seconds': model_state['fit_seconds'],
+                'updated_at': model_state['updated_at']
             }
         })
     except Exception as e:
@@ -305,13 +418,64 @@ def index():
 
 @app.route('/data')
 def get_data():
-    data = load_data()
-    return jsonify(data)
+    try:
+        filters = parse_cube_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': f'筛选参数错误: {str(e)}'}), 400
+    
+    data = get_summary()
+    if not filters:
+        return jsonify(data)
+    
+    # 带筛选条件时由订单立方体回答（无需重新扫描明细数据），字段与未筛选时相同：
+    # 月度/季度/小时分布按筛选条件计算，UNFILTERED_KEYS 中的字段仍为全部数据的结果
+    cube_result = get_order_cube().query(**filters)
+    result = dict(data)
+    for key in ['monthly_sales', 'quarterly_sales', 'hourly_orders', 'order_type_sales']:
+        result[key] = cube_result[key]
+    result['filtered_totals'] = {
+        '订单数': cube_result['total_orders'],
+        '订单行数': cube_result['total_lines'],
+        '订货量': cube_result['total_quantity']
+    }
+    result['unfiltered_keys'] = UNFILTERED_KEYS
+    result['version'] = cube_result['version']
+    result['filters'] = filters
+    return jsonify(convert_to_native_types(result))
 
 @app.route('/forecast/<int:sku_id>')
 def get_forecast(sku_id):
     result = sarima_forecast(sku_id)
     return jsonify(result)
 
+@app.route('/inventory')
+def get_inventory():
+    try:
+        lead_time = float(request.args.get('lead_time', 2.0))
+        lead_time_std = float(request.args.get('lead_time_std', 0.0))
+        limit = int(request.args.get('limit', 100))
+        service_levels = {c: float(request.args[f'service_level_{c}']) for c in SKU_CLASSES if f'service_level_{c}' in request.args}
+        sku_class = request.args.get('sku_class', '').upper() or None
+        if sku_class is not None and sku_class not in SKU_CLASSES:
+            raise ValueError(f'sku_class 必须是 {",".join(SKU_CLASSES)}')
+        if limit < 0:
+            raise ValueError('limit 不能为负')
+        result = inventory_plan(lead_time, lead_time_std, service_levels, sku_class, limit)
+    except ValueError as e:
+        return jsonify({'error': f'参数错误: {str(e)}'}), 400
+    return jsonify(result)
+
+@app.route('/workload')
+def get_workload():
+    try:
+        stat = request.args.get('stat', 'mean')
+        split = request.args.get('split', '0').lower() in ('1', 'true', 'yes')
+        assumptions = {key: float(request.args[key]) for key in ('lines_per_picker_hour', 'units_per_picker_hour', 'utilization')
+                       if key in request.args}
+        result = workload_plan(stat, split, **assumptions)
+    except ValueError as e:
+        return jsonify({'error': f'参数错误: {str(e)}'}), 400
+    return jsonify(result)
+
 if __name__ == '__main__':
     app.run(debug=True, host='localhost', port=5000)
\ No newline at end of file
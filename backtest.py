@@ -0,0 +1,330 @@
+import pandas as pd
+import numpy as np
+import argparse
+import functools
+import hashlib
+import inspect
+import json
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from inventory_planning import weekly_demand_matrix
+from order_cube import sku_abc_class, SKU_CLASSES
+
+# 预测方法回测（滚动起点）
+# 对每个SKU的周销量序列，在多个预测起点上只用起点之前的数据训练、预测之后horizon周，
+# 计算 MAPE / WAPE / MASE，并按SKU和ABC分类汇总、给各方法排名，
+# 用来判断 SARIMA 是否真的优于简单方法，把计算资源花在有回报的SKU上。
+# 各 (SKU, 方法) 的回测在进程池中并行执行，结果按“序列内容 + 方法 + 回测参数”缓存到磁盘。
+
+CACHE_DIR = '.backtest_cache'
+METHODS = ['naive', 'seasonal_naive', 'moving_average', 'ses', 'sarima']
+
+
+def forecast_naive(train, horizon, **kwargs):
+    """上周销量作为预测"""
+    return np.repeat(train[-1], horizon)
+
+
+def forecast_seasonal_naive(train, horizon, season=52, **kwargs):
+    """去年同期销量作为预测"""
+    if len(train) < season:
+        raise ValueError(f'训练数据只有{len(train)}周，不足一个季节周期（{season}周）')
+    last_season = train[-season:]
+    return np.resize(last_season, horizon) if horizon > season else last_season[:horizon]
+
+
+def forecast_moving_average(train, horizon, window=4, **kwargs):
+    """最近window周平均值作为预测"""
+    return np.repeat(train[-window:].mean(), horizon)
+
+
+def forecast_ses(train, horizon, **kwargs):
+    """简单指数平滑"""
+    from statsmodels.tsa.holtwinters import SimpleExpSmoothing
+    model = SimpleExpSmoothing(train, initialization_method='estimated').fit()
+    return model.forecast(horizon)
+
+
+def forecast_sarima(train, horizon, season=52, **kwargs):
+    """与线上预测相同设定的SARIMA模型"""
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+    model = SARIMAX(train, order=(1, 1, 1), seasonal_order=(1, 1, 1, season))
+    return model.fit(disp=False).forecast(horizon)
+
+
+FORECASTERS = {
+    'naive': forecast_naive,
+    'seasonal_naive': forecast_seasonal_naive,
+    'moving_average': forecast_moving_average,
+    'ses': forecast_ses,
+    'sarima': forecast_sarima
+}
+
+
+def min_history(method, season=52):
+    """各方法能够给出预测的最少训练周数：seasonal_naive 需要完整的一个季节"""
+    if method == 'seasonal_naive':
+        return season
+    return 2
+
+
+def full_history(method, season=52):
+    """各方法全部参数都能被估计所需的训练周数
+
+    SARIMA(1,1,1)(1,1,1,s) 差分后还要剩下一个季节，即 s + d + D×s 周；
+    少于这个长度时 statsmodels 仍能拟合，但季节参数无法估计（给出警告并把参数置零）。
+    线上预测就是在这样的数据上拟合的，因此回测照常评估，只在结果中附加警告。
+    """
+    if method == 'sarima':
+        return season + 1 + season
+    return min_history(method, season)
+
+
+def history_warning(method, origins, season=52):
+    """训练数据不足以估计全部参数时返回警告文字，否则返回None"""
+    required = full_history(method, season)
+    short = sum(origin < required for origin in origins)
+    if not short:
+        return None
+    return f'{short}/{len(origins)}个预测起点训练数据少于{required}周，季节参数无法估计'
+
+
+def rolling_origins(n_obs, horizon=4, n_folds=8, step=4, min_train=26):
+    """计算滚动预测起点：最后一折恰好用到序列末尾，训练集不足min_train周的折被跳过"""
+    last = n_obs - horizon
+    origins = [last - step * k for k in range(n_folds)]
+    return sorted(t for t in origins if t >= min_train)
+
+
+def backtest_series(values, method, origins, horizon=4, season=52):
+    """对一条序列在各起点上回测一个方法，返回误差汇总（预测失败时返回None）
+
+    只使用训练数据达到 min_history 的预测起点，没有可用起点时返回None。
+    """
+    forecaster = FORECASTERS[method]
+    origins = [origin for origin in origins if origin >= min_history(method, season)]
+    if not origins:
+        return None
+    abs_error = 0.0
+    actual_total = 0.0
+    ape = []
+    scaled = []
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        for origin in origins:
+            train = values[:origin]
+            actual = values[origin:origin + horizon]
+            try:
+                forecast = np.asarray(forecaster(train, horizon, season=season), dtype=np.float64)
+            except Exception:
+                return None
+            if not np.all(np.isfinite(forecast)):
+                return None
+
+            errors = np.abs(actual - forecast)
+            abs_error += errors.sum()
+            actual_total += np.abs(actual).sum()
+            nonzero = actual != 0
+            ape.extend(errors[nonzero] / np.abs(actual[nonzero]))
+
+            # MASE：以训练集上一步naive预测的平均绝对误差为尺度
+            scale = np.mean(np.abs(np.diff(train))) if len(train) > 1 else 0.0
+            if scale > 0:
+                scaled.append(errors.mean() / scale)
+
+    return {
+        'abs_error': float(abs_error),
+        'actual': float(actual_total),
+        'mape': float(np.mean(ape) * 100) if ape else None,
+        'wape': float(abs_error / actual_total * 100) if actual_total > 0 else None,
+        'mase': float(np.mean(scaled)) if scaled else None,
+        'folds': len(origins),
+        'warning': history_warning(method, origins, season)
+    }
+
+
+def _run_task(task):
+    sku_id, method, values, origins, horizon, season = task
+    return sku_id, method, backtest_series(values, method, origins, horizon, season)
+
+
+@functools.lru_cache(maxsize=None)
+def _code_source(method):
+    """预测函数和回测误差计算的源代码，代码变化时缓存失效"""
+    return ''.join(inspect.getsource(func) for func in (FORECASTERS[method], backtest_series, history_warning))
+
+
+def _cache_path(cache_dir, values, method, origins, horizon, season):
+    payload = json.dumps({'method': method, 'origins': origins, 'horizon': horizon, 'season': season,
+                          'code': _code_source(method)})
+    digest = hashlib.sha256(np.ascontiguousarray(values, dtype=np.float64).tobytes() + payload.encode('utf-8'))
+    return os.path.join(cache_dir, f'{method}-{digest.hexdigest()[:20]}.json')
+
+
+def run_backtest(df, methods=METHODS, sku_ids=None, horizon=4, n_folds=8, step=4, min_train=26, season=52,
+                 cache_dir=CACHE_DIR, max_workers=None):
+    """对指定SKU（默认全部）回测各方法，返回每个 (SKU, 方法) 一行的误差明细"""
+    all_skus, weeks, demand = weekly_demand_matrix(df)
+    classes = sku_abc_class(df).reindex(all_skus)
+    rows = {int(sku_id): row for row, sku_id in enumerate(all_skus)}
+    if sku_ids is None:
+        sku_ids = [int(sku_id) for sku_id in all_skus]
+    unknown = [sku_id for sku_id in sku_ids if sku_id not in rows]
+    if unknown:
+        print(f"以下SKU没有销售数据，已跳过: {unknown}")
+        sku_ids = [sku_id for sku_id in sku_ids if sku_id in rows]
+
+    origins = rolling_origins(len(weeks), horizon, n_folds, step, min_train)
+    if not origins:
+        raise ValueError(f'历史数据只有{len(weeks)}周，不足以进行回测（至少需要{min_train + horizon}周）')
+
+    # 没有任何预测起点能给出预测的方法记为失败（历史不足），不退化为其他方法；
+    # 能预测但参数无法全部估计的方法（如一年数据上的SARIMA）按线上设定照常评估，结果附加警告
+    method_origins = {}
+    short_methods = []
+    for method in methods:
+        method_origins[method] = [origin for origin in origins if origin >= min_history(method, season)]
+        if not method_origins[method]:
+            short_methods.append(method)
+            print(f"警告: {method} 至少需要{min_history(method, season)}周训练数据，"
+                  f"{len(origins)}个预测起点都不满足，全部SKU记为失败（历史不足）")
+            continue
+        if len(method_origins[method]) < len(origins):
+            print(f"警告: {method} 只在{len(method_origins[method])}/{len(origins)}个预测起点上评估")
+        warning = history_warning(method, method_origins[method], season)
+        if warning:
+            print(f"警告: {method} {warning}（与线上预测相同），结果仍参与排名")
+
+    records = []
+    tasks = []
+    cached = 0
+    for sku_id in sku_ids:
+        values = demand[rows[sku_id]]
+        for method in methods:
+            if method in short_methods:
+                records.append((sku_id, method, '历史不足'))
+                continue
+            path = _cache_path(cache_dir, values, method, method_origins[method], horizon, season) if cache_dir else None
+            if path and os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    records.append((sku_id, method, json.load(f)))
+                cached += 1
+            else:
+                tasks.append((sku_id, method, values, method_origins[method], horizon, season))
+
+    print(f"回测: {len(sku_ids)}个SKU × {len(methods)}种方法，{len(origins)}个预测起点，"
+          f"历史不足{len(sku_ids) * len(short_methods)}项，命中缓存{cached}项，需计算{len(tasks)}项")
+
+    if tasks:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            for sku_id, method, result in executor.map(_run_task, tasks, chunksize=8):
+                records.append((sku_id, method, result))
+                if cache_dir:
+                    os.makedirs(cache_dir, exist_ok=True)
+                    path = _cache_path(cache_dir, demand[rows[sku_id]], method, method_origins[method], horizon, season)
+                    with open(path, 'w', encoding='utf-8') as f:
+                        json.dump(result, f)
+
+    def failure_reason(result):
+        if result == '历史不足':
+            return result
+        return '预测失败' if result is None else None
+
+    detail = pd.DataFrame([
+        {'SKU编号': sku_id, '分类': classes[sku_id], '方法': method,
+         **(result if isinstance(result, dict) else {}),
+         '失败': not isinstance(result, dict), '失败原因': failure_reason(result)}
+        for sku_id, method, result in records
+    ], columns=['SKU编号', '分类', '方法', 'abs_error', 'actual', 'mape', 'wape', 'mase', 'folds', 'warning',
+                '失败', '失败原因'])
+    detail = detail.rename(columns={'folds': '评估折数', 'warning': '警告'})
+    return detail.sort_values(['SKU编号', '方法']).reset_index(drop=True)
+
+
+def rank_methods(detail):
+    """按ABC分类和全部SKU汇总各方法误差并排名（按WAPE升序）"""
+    frames = []
+    # 全部SKU都失败的方法也保留在排名中，以便看到失败数
+    methods = detail['方法'].unique()
+    for class_name, group in [('全部', detail)] + list(detail.groupby('分类')):
+        ok = group[~group['失败']]
+        summary = ok.groupby('方法').agg(
+            SKU数量=('SKU编号', 'size'),
+            误差合计=('abs_error', 'sum'),
+            销量合计=('actual', 'sum'),
+            MAPE=('mape', 'mean'),
+            MASE=('mase', 'mean'),
+            评估折数=('评估折数', 'max'),
+            警告=('警告', 'first')
+        ).reindex(methods)
+        summary.index.name = '方法'
+        summary['SKU数量'] = summary['SKU数量'].fillna(0).astype(np.int64)
+        summary['WAPE'] = summary['误差合计'] / summary['销量合计'].where(summary['销量合计'] > 0) * 100
+        summary['失败数'] = group[group['失败']].groupby('方法').size().reindex(summary.index, fill_value=0)
+
+        # 每个SKU上各方法WAPE相对naive的胜率
+        pivot = ok.pivot_table(index='SKU编号', columns='方法', values='wape')
+        if 'naive' in pivot:
+            summary['优于naive比例(%)'] = pivot.lt(pivot['naive'], axis=0).mean().reindex(summary.index) * 100
+
+        summary = summary.drop(columns=['误差合计', '销量合计']).sort_values('WAPE')
+        summary = summary[[c for c in summary.columns if c != '警告'] + ['警告']]
+        summary = summary.reset_index()
+        # 没有有效结果的方法不参与排名
+        ranks = pd.Series(np.arange(1, len(summary) + 1), dtype='Int64')
+        summary.insert(0, '排名', ranks.where(summary['WAPE'].notna().to_numpy()))
+        summary.insert(0, '分类', class_name)
+        frames.append(summary)
+
+    order = {name: i for i, name in enumerate(['全部'] + SKU_CLASSES)}
+    ranking = pd.concat(frames, ignore_index=True)
+    ranking = ranking.sort_values(['分类', '排名'], key=lambda s: s.map(order) if s.name == '分类' else s)
+    return ranking.round(3).reset_index(drop=True)
+
+
+def select_skus(df, per_class=30):
+    """每个ABC分类取销量最高的per_class个SKU"""
+    classes = sku_abc_class(df)
+    return [int(sku_id) for c in SKU_CLASSES for sku_id in classes[classes == c].index[:per_class]]
+
+
+def main(argv=None):
+    from order_analysis import load_and_merge_data, EXCEL_FILE
+
+    parser = argparse.ArgumentParser(description='滚动起点回测各预测方法')
+    parser.add_argument('--excel-file', default=EXCEL_FILE, help='原始订单数据文件')
+    parser.add_argument('--methods', nargs='+', choices=METHODS, default=METHODS, help='参与回测的方法')
+    parser.add_argument('--skus', type=int, nargs='+', help='指定SKU编号')
+    parser.add_argument('--per-class', type=int, default=30, help='未指定SKU时每个ABC分类回测的SKU数量')
+    parser.add_argument('--all', action='store_true', help='回测全部SKU')
+    parser.add_argument('--horizon', type=int, default=4, help='每个起点向后预测的周数')
+    parser.add_argument('--folds', type=int, default=8, help='预测起点数量')
+    parser.add_argument('--step', type=int, default=4, help='相邻起点间隔周数')
+    parser.add_argument('--min-train', type=int, default=26, help='最少训练周数')
+    parser.add_argument('--season', type=int, default=52, help='季节周期（周）')
+    parser.add_argument('--workers', type=int, default=None, help='并行进程数')
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help='回测结果缓存目录')
+    parser.add_argument('--output', default='回测明细.csv', help='每个SKU、每种方法的误差明细')
+    args = parser.parse_args(argv)
+
+    df = load_and_merge_data(args.excel_file)
+    if args.skus:
+        sku_ids = args.skus
+    elif args.all:
+        sku_ids = None
+    else:
+        sku_ids = select_skus(df, args.per_class)
+
+    detail = run_backtest(df, args.methods, sku_ids, args.horizon, args.folds, args.step, args.min_train,
+                          args.season, args.cache_dir, args.workers)
+    detail.to_csv(args.output, index=False, encoding='utf-8-sig')
+
+    with pd.option_context('display.max_columns', None, 'display.width', 200):
+        print(rank_methods(detail).to_string(index=False))
+    print(f"回测明细已导出到 {args.output}")
+
+
+if __name__ == '__main__':
+    main()
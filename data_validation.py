@@ -0,0 +1,236 @@
+import pandas as pd
+import numpy as np
+import argparse
+import os
+from openpyxl import load_workbook
+
+# 订单数据质量校验
+# 按块流式读取原始数据，对每块做向量化校验，不合格的行连同原因写入隔离文件，
+# 代替原先的 dropna() + astype(int)：坏行既不会被静默丢弃，也不会让整个加载过程崩溃。
+# 跨块的重复行检测只保存 (订单编号, SKU编号) 组合键的有序整数数组，内存占用为每行8字节。
+
+REQUIRED_COLUMNS = ['订单编号', 'SKU编号', '订货量', '时间', '客户编号']
+CUSTOMER_PATTERN = r'^C\d{4}$'
+SHEET_NAMES = ['1月', '2月', '3月', '4月', '5月', '6月', '7月', '8月', '9月', '10月', '11月', '12月']
+QUARANTINE_FILE = '隔离数据.csv'
+CHUNK_SIZE = 50000
+# 订单编号和SKU编号的取值范围：重复检测把两者拼成一个64位组合键，每个编号必须能放进31位
+MAX_ID = 2 ** 31
+# 订货量上限：超出的值转换为int64时会溢出，按异常数据隔离
+MAX_QUANTITY = 2 ** 31
+
+
+def iter_order_chunks(path, sheet_names=None, chunk_size=CHUNK_SIZE):
+    """按块读取订单数据，逐块返回 (来源, 起始行号, DataFrame)
+
+    Excel文件以只读模式逐行读取，CSV文件使用 read_csv 的 chunksize，内存占用与块大小成正比。
+    """
+    if path.lower().endswith('.csv'):
+        start_row = 2
+        for chunk in pd.read_csv(path, chunksize=chunk_size):
+            yield os.path.basename(path), start_row, chunk
+            start_row += len(chunk)
+        return
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for sheet in sheet_names or workbook.sheetnames:
+            if sheet not in workbook.sheetnames:
+                print(f"无法读取工作表 {sheet}: 工作表不存在")
+                continue
+
+            rows = workbook[sheet].iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                continue
+            columns = [str(c).strip() if c is not None else '' for c in header]
+
+            buffer = []
+            start_row = 2
+            for row in rows:
+                buffer.append(row)
+                if len(buffer) >= chunk_size:
+                    yield sheet, start_row, pd.DataFrame(buffer, columns=columns)
+                    start_row += len(buffer)
+                    buffer = []
+            if buffer:
+                yield sheet, start_row, pd.DataFrame(buffer, columns=columns)
+    finally:
+        workbook.close()
+
+
+def _integer_column(values):
+    """转换为整数，返回 (数值Series, 非法值掩码)；缺失值不计为非法值"""
+    numbers = pd.to_numeric(values, errors='coerce')
+    invalid = values.notna() & (numbers.isna() | (numbers % 1 != 0))
+    return numbers, invalid.to_numpy()
+
+
+def validate_chunk(chunk, seen_keys, start_time=None, end_time=None, expected_month=None):
+    """向量化校验一个数据块
+
+    返回 (合格数据, 不合格数据, 更新后的已见组合键数组)，不合格数据带“拒绝原因”列。
+    """
+    missing_columns = [c for c in REQUIRED_COLUMNS if c not in chunk.columns]
+    if missing_columns:
+        raise ValueError(f"数据缺少必要列: {', '.join(missing_columns)}")
+
+    chunk = chunk.reset_index(drop=True)
+    order_ids, bad_order = _integer_column(chunk['订单编号'])
+    sku_ids, bad_sku = _integer_column(chunk['SKU编号'])
+    quantity, bad_quantity = _integer_column(chunk['订货量'])
+    times = pd.to_datetime(chunk['时间'], errors='coerce')
+    customers = chunk['客户编号'].astype('string').str.strip()
+
+    checks = {
+        '缺失值': chunk[REQUIRED_COLUMNS].isna().any(axis=1).to_numpy(),
+        '订单编号不是整数': bad_order,
+        'SKU编号不是整数': bad_sku,
+        '订单编号/SKU编号超出范围': ((order_ids < 0) | (order_ids >= MAX_ID) | (sku_ids < 0) | (sku_ids >= MAX_ID)).to_numpy(),
+        '订货量不是整数': bad_quantity,
+        '订货量非正数': (quantity <= 0).to_numpy(),
+        '订货量超出范围': (quantity >= MAX_QUANTITY).to_numpy(),
+        '客户编号格式错误': (customers.notna() & ~customers.str.match(CUSTOMER_PATTERN).fillna(False)).to_numpy(dtype=bool),
+        '时间无法解析': (chunk['时间'].notna() & times.isna()).to_numpy()
+    }
+
+    out_of_range = np.zeros(len(chunk), dtype=bool)
+    if start_time is not None:
+        out_of_range |= (times < pd.Timestamp(start_time)).to_numpy()
+    if end_time is not None:
+        out_of_range |= (times >= pd.Timestamp(end_time)).to_numpy()
+    if expected_month is not None:
+        # 每个月份工作表只应包含该月的数据
+        out_of_range |= (times.notna() & (times.dt.month != expected_month)).to_numpy()
+    checks['时间超出范围'] = out_of_range
+
+    rejected = np.logical_or.reduce(list(checks.values()))
+
+    # 重复订单行：只在其余校验都通过的行中检测，块内保留第一次出现的行
+    candidates = np.flatnonzero(~rejected)
+    keys = (order_ids.to_numpy()[candidates].astype(np.int64) << 32) | sku_ids.to_numpy()[candidates].astype(np.int64)
+    _, first_index = np.unique(keys, return_index=True)
+    duplicated = np.ones(len(keys), dtype=bool)
+    duplicated[first_index] = False
+    if len(seen_keys):
+        # seen_keys 保持有序，用二分查找判断是否在之前的块中出现过
+        position = np.minimum(np.searchsorted(seen_keys, keys), len(seen_keys) - 1)
+        duplicated |= seen_keys[position] == keys
+    checks['重复订单行'] = np.zeros(len(chunk), dtype=bool)
+    checks['重复订单行'][candidates[duplicated]] = True
+    rejected[candidates[duplicated]] = True
+    seen_keys = np.concatenate([seen_keys, keys[~duplicated]])
+    seen_keys.sort(kind='stable')
+
+    # 拼接拒绝原因（只处理不合格行）
+    rejected_index = np.flatnonzero(rejected)
+    reasons = np.full(len(rejected_index), '', dtype=object)
+    for reason, mask in checks.items():
+        hit = mask[rejected_index]
+        reasons[hit] = reasons[hit] + reason + ';'
+
+    bad = chunk.iloc[rejected_index].copy()
+    bad['拒绝原因'] = [r.rstrip(';') for r in reasons]
+
+    valid_index = np.flatnonzero(~rejected)
+    good = pd.DataFrame({
+        '订单编号': order_ids.to_numpy()[valid_index].astype(np.int64),
+        'SKU编号': sku_ids.to_numpy()[valid_index].astype(np.int64),
+        '订货量': quantity.to_numpy()[valid_index].astype(np.int64),
+        '时间': times.to_numpy()[valid_index],
+        '客户编号': customers.to_numpy()[valid_index].astype(str)
+    })
+    # 保留原始数据中的其他列
+    for column in chunk.columns:
+        if column not in good.columns:
+            good[column] = chunk[column].to_numpy()[valid_index]
+
+    return good, bad, seen_keys
+
+
+def load_validated_orders(path, sheet_names=SHEET_NAMES, quarantine_file=QUARANTINE_FILE, chunk_size=CHUNK_SIZE,
+                          start_time=None, end_time=None, keep_data=True, output_file=None):
+    """流式读取并校验订单数据，返回 (合格数据, 校验报告)，不合格行写入隔离文件
+
+    keep_data=False 时不在内存中保留合格数据（返回的合格数据为None），内存占用只与块大小和已见组合键有关；
+    指定 output_file 时合格数据逐块追加写入该CSV文件。
+    """
+    for target in (quarantine_file, output_file):
+        if target and os.path.exists(target):
+            os.remove(target)
+
+    seen_keys = np.empty(0, dtype=np.int64)
+    valid_chunks = []
+    valid_rows = 0
+    reason_counts = {}
+    total_rows = 0
+    quarantined_rows = 0
+
+    for source, start_row, chunk in iter_order_chunks(path, sheet_names, chunk_size):
+        expected_month = SHEET_NAMES.index(source) + 1 if source in SHEET_NAMES else None
+        good, bad, seen_keys = validate_chunk(chunk, seen_keys, start_time, end_time, expected_month)
+
+        total_rows += len(chunk)
+        valid_rows += len(good)
+        if keep_data:
+            valid_chunks.append(good)
+        if output_file and len(good):
+            first_write = not os.path.exists(output_file)
+            good.to_csv(output_file, mode='a', index=False, header=first_write,
+                        encoding='utf-8-sig' if first_write else 'utf-8')
+
+        if len(bad):
+            quarantined_rows += len(bad)
+            for reason in bad['拒绝原因']:
+                for name in reason.split(';'):
+                    reason_counts[name] = reason_counts.get(name, 0) + 1
+            if quarantine_file:
+                bad.insert(0, '行号', bad.index.to_numpy() + start_row)
+                bad.insert(0, '来源', source)
+                # 首次写入带表头和BOM（便于Excel打开），之后追加
+                first_write = not os.path.exists(quarantine_file)
+                bad.to_csv(quarantine_file, mode='a', index=False, header=first_write,
+                           encoding='utf-8-sig' if first_write else 'utf-8')
+
+    if not total_rows:
+        raise ValueError("没有成功读取任何数据")
+
+    merged_df = pd.concat(valid_chunks, ignore_index=True) if keep_data else None
+    report = {
+        '总行数': total_rows,
+        '合格行数': valid_rows,
+        '隔离行数': quarantined_rows,
+        '拒绝原因统计': reason_counts
+    }
+
+    print(f"数据校验: 共{total_rows}行，合格{valid_rows}行，隔离{quarantined_rows}行")
+    for reason, count in sorted(reason_counts.items(), key=lambda item: -item[1]):
+        print(f"  {reason}: {count}行")
+    if quarantined_rows and quarantine_file:
+        print(f"不合格数据已写入 {quarantine_file}")
+    if output_file and valid_rows:
+        print(f"合格数据已写入 {output_file}")
+
+    return merged_df, report
+
+
+def main(argv=None):
+    from order_analysis import EXCEL_FILE
+
+    parser = argparse.ArgumentParser(description='校验订单数据质量，不合格行写入隔离文件')
+    parser.add_argument('--excel-file', default=EXCEL_FILE, help='原始订单数据文件（xlsx或csv）')
+    parser.add_argument('--quarantine', default=QUARANTINE_FILE, help='隔离文件')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='每块行数')
+    parser.add_argument('--start-time', help='允许的最早时间，如 2024-01-01')
+    parser.add_argument('--end-time', help='允许的最晚时间（不含），如 2025-01-01')
+    parser.add_argument('--output', help='合格数据导出的CSV文件，不指定时只统计不导出')
+    args = parser.parse_args(argv)
+
+    # 命令行只需要校验报告，合格数据逐块写出或丢弃，不在内存中累积
+    load_validated_orders(args.excel_file, quarantine_file=args.quarantine, chunk_size=args.chunk_size,
+                          start_time=args.start_time, end_time=args.end_time, keep_data=False,
+                          output_file=args.output)
+
+
+if __name__ == '__main__':
+    main()
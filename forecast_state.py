@@ -0,0 +1,275 @@
+import pandas as pd
+import numpy as np
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from statsmodels.tsa.statespace.sarimax import SARIMAX, SARIMAXResults
+
+# SARIMA模型状态持久化与热启动更新
+# 每个SKU保存一份模型状态：参数（JSON）+ 序列化的拟合结果（pickle）。
+# 新的周数据到达时：
+#   - 历史数据未变化：用 results.append() 追加新观测值，只做滤波不重新估计参数；
+#     累计追加的周数达到 refit_interval 时，以原参数为初值重新估计
+#   - 历史数据被修正：以原参数作为 start_params 重新拟合
+#   - 没有状态或模型设定变化：从默认初值冷启动拟合
+
+STATE_DIR = '.forecast_state'
+ORDER = (1, 1, 1)
+SEASONAL_ORDER = (1, 1, 1, 52)
+# 累计追加多少周后重新估计一次参数
+REFIT_INTERVAL = 13
+
+
+def weekly_sales_series(df, sku_id):
+    """按周聚合指定SKU的销售数据，返回周一为索引、缺失周补0的规则周序列
+
+    周按实际日期所在周的周一划分（与库存计划的需求矩阵一致），不使用年份+ISO周号拼接，
+    避免跨年的周错位。
+    """
+    sku_data = df[df['SKU编号'] == sku_id]
+    if sku_data.empty:
+        return None
+
+    times = sku_data['时间'].dt.normalize()
+    week_start = times - pd.to_timedelta(times.dt.dayofweek, unit='D')
+    ts = sku_data['订货量'].groupby(week_start.rename('日期')).sum().sort_index()
+    # 规则的周频率是 append() 追加新观测值的前提
+    return ts.asfreq('W-MON', fill_value=0).astype(float)
+
+
+def series_digest(values):
+    """计算序列取值的哈希，用于判断已拟合的历史数据是否被修正"""
+    return hashlib.sha256(np.ascontiguousarray(values, dtype=np.float64).tobytes()).hexdigest()
+
+
+class ForecastStateStore:
+    """按SKU持久化SARIMA模型状态，并在新数据到达时热启动更新"""
+
+    def __init__(self, state_dir=STATE_DIR, order=ORDER, seasonal_order=SEASONAL_ORDER, refit_interval=REFIT_INTERVAL):
+        self.state_dir = state_dir
+        self.order = tuple(order)
+        self.seasonal_order = tuple(seasonal_order)
+        self.refit_interval = refit_interval
+        # 每个SKU一把锁：并发请求同一SKU时只拟合一次，其余请求直接复用结果
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def _lock(self, sku_id):
+        with self._locks_guard:
+            return self._locks.setdefault(int(sku_id), threading.Lock())
+
+    def _paths(self, sku_id):
+        sku_dir = os.path.join(self.state_dir, f'sku_{int(sku_id)}')
+        return sku_dir, os.path.join(sku_dir, 'params.json'), os.path.join(sku_dir, 'results.pkl')
+
+    def stored_skus(self):
+        """返回已保存模型状态的SKU编号列表"""
+        if not os.path.isdir(self.state_dir):
+            return []
+        return [int(name[4:]) for name in os.listdir(self.state_dir) if name.startswith('sku_') and name[4:].isdigit()]
+
+    def load_residuals(self, sku_id):
+        """读取模型残差（已跳过差分初始化阶段），不存在时返回None"""
+        resid_path = os.path.join(self.state_dir, f'sku_{int(sku_id)}', 'resid.npy')
+        if not os.path.exists(resid_path):
+            return None
+        return np.load(resid_path)
+
+    def load_meta(self, sku_id):
+        """只读取SKU的模型参数信息（不反序列化拟合结果），不存在时返回None"""
+        _, params_path, _ = self._paths(sku_id)
+        if not os.path.exists(params_path):
+            return None
+        with open(params_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def load(self, sku_id):
+        """读取SKU的模型状态，不存在时返回 (None, None)"""
+        _, params_path, results_path = self._paths(sku_id)
+        if not (os.path.exists(params_path) and os.path.exists(results_path)):
+            return None, None
+        return self.load_meta(sku_id), SARIMAXResults.load(results_path)
+
+    def save(self, sku_id, results, ts, mode, fit_seconds, appended_weeks=0):
+        """保存模型参数和拟合结果（先写临时文件再替换，避免并发读到半个文件）"""
+        sku_dir, params_path, results_path = self._paths(sku_id)
+        os.makedirs(sku_dir, exist_ok=True)
+
+        meta = {
+            'sku_id': int(sku_id),
+            'order': list(self.order),
+            'seasonal_order': list(self.seasonal_order),
+            'params': {name: float(value) for name, value in results.params.items()},
+            'nobs': int(len(ts)),
+            'last_date': ts.index[-1].strftime('%Y-%m-%d'),
+            'data_digest': series_digest(ts.values),
+            'mode': mode,
+            # 上次估计参数后累计追加的周数
+            'appended_weeks': int(appended_weeks),
+            'fit_seconds': round(fit_seconds, 4),
+            'updated_at': datetime.now().isoformat(timespec='seconds')
+        }
+
+        results.save(f'{results_path}.tmp')
+        os.replace(f'{results_path}.tmp', results_path)
+        # 残差单独保存，库存计划读取时无需反序列化整个拟合结果
+        # 跳过差分初始化阶段（loglikelihood_burn）的残差，其取值没有意义
+        resid_path = os.path.join(sku_dir, 'resid.npy')
+        with open(f'{resid_path}.tmp', 'wb') as f:
+            np.save(f, np.asarray(results.resid, dtype=np.float64)[results.loglikelihood_burn:])
+        os.replace(f'{resid_path}.tmp', resid_path)
+        with open(f'{params_path}.tmp', 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        os.replace(f'{params_path}.tmp', params_path)
+        return meta
+
+    def cold_fit(self, ts):
+        """从默认初值拟合模型"""
+        model = SARIMAX(ts, order=self.order, seasonal_order=self.seasonal_order)
+        return model.fit(disp=False)
+
+    def update(self, sku_id, ts, refit=None):
+        """根据最新周序列更新SKU模型，返回 (拟合结果, 状态信息)
+
+        refit=False 时只用原参数对新观测值做滤波（最快），
+        refit=True 时以原参数为初值重新估计参数，
+        refit=None 时累计追加周数达到 refit_interval 才重新估计。
+        """
+        with self._lock(sku_id):
+            return self._update(sku_id, ts, refit)
+
+    def _warm_fit(self, meta, results, ts, refit):
+        """在已加载的模型状态上做热启动更新（不保存），返回 (拟合结果, 模式, 累计追加周数)
+
+        没有状态或模型设定变化时冷启动；没有新数据时返回 (原拟合结果, 'reuse', 原累计周数)。
+        """
+        if meta is None or tuple(meta['order']) != self.order or tuple(meta['seasonal_order']) != self.seasonal_order:
+            # 没有状态或模型设定变化：冷启动
+            return self.cold_fit(ts), 'cold', 0
+
+        nobs = meta['nobs']
+        history_unchanged = (
+            len(ts) >= nobs
+            and ts.index[nobs - 1].strftime('%Y-%m-%d') == meta['last_date']
+            and series_digest(ts.values[:nobs]) == meta['data_digest']
+        )
+        if history_unchanged and len(ts) == nobs:
+            # 没有新数据：直接复用
+            return results, 'reuse', meta.get('appended_weeks', 0)
+        if history_unchanged:
+            # 追加新的周观测值
+            appended_weeks = meta.get('appended_weeks', 0) + len(ts) - nobs
+            if refit is None:
+                refit = appended_weeks >= self.refit_interval
+            if refit:
+                appended_weeks = 0
+            results = results.append(ts.iloc[nobs:], refit=refit, fit_kwargs={'disp': False} if refit else None)
+            return results, 'append_refit' if refit else 'append', appended_weeks
+
+        # 历史数据被修正：以原参数为初值重新拟合
+        model = SARIMAX(ts, order=self.order, seasonal_order=self.seasonal_order)
+        return model.fit(start_params=results.params, disp=False), 'warm_refit', 0
+
+    def _update(self, sku_id, ts, refit):
+        request_start = time.perf_counter()
+        meta, results = self.load(sku_id)
+        start = time.perf_counter()
+        results, mode, appended_weeks = self._warm_fit(meta, results, ts, refit)
+
+        if mode == 'reuse':
+            # 没有拟合：返回副本，耗时为本次读取模型状态的实际耗时
+            return results, dict(meta, mode='reuse', fit_seconds=round(time.perf_counter() - request_start, 4))
+
+        meta = self.save(sku_id, results, ts, mode, time.perf_counter() - start, appended_weeks)
+        return results, meta
+
+    def check_against_cold_fit(self, sku_id, ts, forecast_weeks=52, refit=None):
+        """对比热启动更新与冷启动拟合的耗时、对数似然和预测差异
+
+        热启动更新基于已保存的模型状态，但结果不写回磁盘；
+        没有已保存的状态或没有新数据时不做对比，返回的 applicable 为 False。
+        """
+        meta, results = self.load(sku_id)
+        if meta is None:
+            return {'sku_id': int(sku_id), 'mode': None, 'applicable': False, 'reason': '没有已保存的模型状态'}
+
+        start = time.perf_counter()
+        warm_results, mode, _ = self._warm_fit(meta, results, ts, refit)
+        warm_seconds = time.perf_counter() - start
+        if mode == 'reuse':
+            return {'sku_id': int(sku_id), 'mode': mode, 'applicable': False, 'reason': '没有新数据，无需更新'}
+
+        start = time.perf_counter()
+        cold_results = self.cold_fit(ts)
+        cold_seconds = time.perf_counter() - start
+
+        warm_forecast = warm_results.forecast(steps=forecast_weeks).values
+        cold_forecast = cold_results.forecast(steps=forecast_weeks).values
+        scale = np.abs(cold_forecast).sum()
+        forecast_wape = float(np.abs(warm_forecast - cold_forecast).sum() / scale * 100) if scale > 0 else 0.0
+
+        return {
+            'sku_id': int(sku_id),
+            'mode': mode,
+            'applicable': True,
+            'warm_seconds': round(warm_seconds, 4),
+            'cold_seconds': round(cold_seconds, 4),
+            'speedup': round(cold_seconds / warm_seconds, 2) if warm_seconds > 0 else None,
+            'warm_llf': float(warm_results.llf),
+            'cold_llf': float(cold_results.llf),
+            # 参数相对差异（sigma2等参数量级较大，用相对值比较）
+            'max_param_rel_diff': float(np.max(np.abs(warm_results.params.values - cold_results.params.values)
+                                               / np.maximum(np.abs(cold_results.params.values), 1e-8))),
+            'forecast_wape': round(forecast_wape, 4)
+        }
+
+
+def main(argv=None):
+    """夜间批量刷新：对销量靠前的A类SKU热启动更新预测模型"""
+    from order_analysis import load_and_merge_data, EXCEL_FILE
+    from order_cube import sku_abc_class
+
+    parser = argparse.ArgumentParser(description='刷新SKU的SARIMA模型状态')
+    parser.add_argument('--excel-file', default=EXCEL_FILE, help='原始订单数据文件')
+    parser.add_argument('--skus', type=int, nargs='+', help='指定SKU编号，默认取销量前N的A类SKU')
+    parser.add_argument('--top', type=int, default=20, help='未指定SKU时刷新的A类SKU数量')
+    parser.add_argument('--state-dir', default=STATE_DIR, help='模型状态目录')
+    parser.add_argument('--refit', choices=['auto', 'always', 'never'], default='auto',
+                        help=f'追加新数据后是否重新估计参数，auto为累计{REFIT_INTERVAL}周重新估计一次')
+    parser.add_argument('--check', action='store_true', help='与冷启动拟合对比耗时和预测差异（热启动结果不写回模型状态）')
+    args = parser.parse_args(argv)
+
+    df = load_and_merge_data(args.excel_file)
+    sku_ids = args.skus
+    if not sku_ids:
+        classes = sku_abc_class(df)
+        sku_ids = classes[classes == 'A'].index[:args.top].tolist()
+
+    refit = {'auto': None, 'always': True, 'never': False}[args.refit]
+    store = ForecastStateStore(args.state_dir)
+    for sku_id in sku_ids:
+        ts = weekly_sales_series(df, sku_id)
+        if ts is None:
+            print(f"SKU {sku_id}: 没有销售数据")
+            continue
+        try:
+            if args.check:
+                report = store.check_against_cold_fit(sku_id, ts, refit=refit)
+                if not report['applicable']:
+                    print(f"SKU {sku_id}: 不对比（{report['reason']}）")
+                    continue
+                print(f"SKU {sku_id}: {report['mode']} 热启动{report['warm_seconds']}s / 冷启动{report['cold_seconds']}s，"
+                      f"对数似然 {report['warm_llf']:.2f} / {report['cold_llf']:.2f}，预测差异WAPE {report['forecast_wape']:.2f}%")
+            else:
+                _, meta = store.update(sku_id, ts, refit=refit)
+                print(f"SKU {sku_id}: {meta['mode']}，耗时{meta['fit_seconds']}s")
+        except Exception as e:
+            print(f"SKU {sku_id}: 模型更新失败: {e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+import pandas as pd
+import numpy as np
+import argparse
+from scipy.stats import norm
+from order_cube import sku_abc_class, SKU_CLASSES
+
+# 基于预测的库存管理：安全库存与再订货点
+# 对全部SKU一次性向量化计算（SKU × 周 矩阵），不逐个SKU循环：
+#   需求波动 σ：预测残差的标准差
+#   安全库存 SS = z(服务水平) × sqrt(L × σ² + d² × σL²)
+#   再订货点 ROP = d × L + SS
+# 其中 d 为平均周需求，L 为补货提前期（周），σL 为提前期标准差（周）
+
+# 各类SKU的默认目标服务水平
+DEFAULT_SERVICE_LEVELS = {'A': 0.98, 'B': 0.95, 'C': 0.90}
+# 模型残差至少有多少周才使用模型残差，否则整个SKU使用移动平均残差
+MIN_MODEL_RESIDUALS = 8
+
+
+def weekly_demand_matrix(df):
+    """构建 SKU × 周 的需求矩阵，返回 (SKU编号数组, 周一日期索引, 需求矩阵)"""
+    sku_codes, sku_ids = pd.factorize(df['SKU编号'], sort=True)
+
+    times = df['时间'].dt.normalize()
+    week_start = (times - pd.to_timedelta(times.dt.dayofweek, unit='D')).to_numpy()
+    first_week = week_start.min()
+    week_codes = ((week_start - first_week) // np.timedelta64(7, 'D')).astype(np.int64)
+    n_weeks = int(week_codes.max()) + 1
+
+    # 一次性累加到 SKU × 周 矩阵，缺失周自然为0
+    demand = np.zeros((len(sku_ids), n_weeks), dtype=np.float64)
+    np.add.at(demand, (sku_codes, week_codes), df['订货量'].to_numpy(dtype=np.float64))
+
+    weeks = pd.date_range(first_week, periods=n_weeks, freq='W-MON')
+    return np.asarray(sku_ids), weeks, demand
+
+
+def moving_average_residuals(demand, window=4):
+    """以前window周移动平均作为预测，返回预测残差矩阵（前window周为NaN）"""
+    n_skus, n_weeks = demand.shape
+    residuals = np.full((n_skus, n_weeks), np.nan)
+    if n_weeks <= window:
+        return residuals
+
+    cumsum = np.cumsum(np.pad(demand, ((0, 0), (1, 0))), axis=1)
+    forecast = (cumsum[:, window:-1] - cumsum[:, :-window - 1]) / window
+    residuals[:, window:] = demand[:, window:] - forecast
+    return residuals
+
+
+def model_residuals(store, sku_ids, weeks):
+    """读取已保存的SARIMA模型残差，按日期对齐填入 SKU × 周 矩阵
+
+    模型最后一周（meta['last_date']）不是需求矩阵最后一周的视为过期模型，跳过；
+    没有模型或模型过期的SKU整行为NaN。
+    """
+    residuals = np.full((len(sku_ids), len(weeks)), np.nan)
+    rows = {int(sku_id): row for row, sku_id in enumerate(sku_ids)}
+    last_week = weeks[-1].strftime('%Y-%m-%d')
+    for sku_id in store.stored_skus():
+        if sku_id not in rows:
+            continue
+        meta = store.load_meta(sku_id)
+        if meta is None or meta.get('last_date') != last_week:
+            continue
+        resid = store.load_residuals(sku_id)
+        if resid is None or len(resid) == 0:
+            continue
+        # 残差对应以 last_date 结尾的连续周
+        resid_weeks = pd.date_range(end=meta['last_date'], periods=len(resid), freq='W-MON')
+        columns = weeks.get_indexer(resid_weeks)
+        matched = columns >= 0
+        residuals[rows[sku_id], columns[matched]] = resid[matched]
+    return residuals
+
+
+def check_lead_time(lead_time, lead_time_std):
+    """校验补货提前期参数：提前期必须是大于0的有限数，标准差必须是不小于0的有限数"""
+    # 用 not (x > 0) 的写法，NaN 同样判为非法
+    if not (lead_time > 0) or not np.isfinite(lead_time):
+        raise ValueError(f'补货提前期必须是大于0的有限数: {lead_time}')
+    if not (lead_time_std >= 0) or not np.isfinite(lead_time_std):
+        raise ValueError(f'补货提前期标准差必须是不小于0的有限数: {lead_time_std}')
+
+
+def plan_inventory(sku_ids, demand, sku_classes, residuals=None, lead_time=2.0, lead_time_std=0.0,
+                   service_levels=None, min_model_residuals=MIN_MODEL_RESIDUALS):
+    """计算每个SKU的需求波动、安全库存和再订货点
+
+    sku_classes 为与 sku_ids 对齐的A/B/C分类数组；residuals 为与 demand 同形状的模型残差矩阵。
+    残差来源按SKU整行选择：模型残差不少于 min_model_residuals 周的SKU使用模型残差，
+    其余SKU使用移动平均预测残差，两种残差不会混在同一个SKU的 σ 中；
+    某个SKU的残差全部缺失时退化为需求标准差。
+    """
+    check_lead_time(lead_time, lead_time_std)
+    levels = dict(DEFAULT_SERVICE_LEVELS)
+    levels.update(service_levels or {})
+    for class_name, level in levels.items():
+        if not 0 < level < 1:
+            raise ValueError(f'{class_name}类服务水平必须在0和1之间: {level}')
+
+    if residuals is None:
+        residuals = moving_average_residuals(demand)
+    else:
+        use_model = np.count_nonzero(~np.isnan(residuals), axis=1) >= min_model_residuals
+        residuals = np.where(use_model[:, None], residuals, moving_average_residuals(demand))
+
+    sku_classes = np.asarray(sku_classes)
+    mean_demand = demand.mean(axis=1)
+    demand_std = demand.std(axis=1, ddof=1) if demand.shape[1] > 1 else np.zeros(len(sku_ids))
+
+    # 需求波动：预测残差的标准差（以0为中心的均方根误差）
+    valid = np.count_nonzero(~np.isnan(residuals), axis=1)
+    squared = np.nansum(np.square(np.nan_to_num(residuals)), axis=1)
+    resid_std = np.sqrt(np.divide(squared, valid - 1, out=np.full(len(sku_ids), np.nan), where=valid > 1))
+    sigma = np.where(np.isnan(resid_std), demand_std, resid_std)
+
+    service_level = np.array([levels[c] for c in SKU_CLASSES])[np.searchsorted(SKU_CLASSES, sku_classes)]
+    z = norm.ppf(service_level)
+
+    safety_stock = z * np.sqrt(lead_time * np.square(sigma) + np.square(mean_demand * lead_time_std))
+    reorder_point = mean_demand * lead_time + safety_stock
+
+    cv = np.divide(demand_std, mean_demand, out=np.zeros_like(mean_demand), where=mean_demand > 0)
+
+    return pd.DataFrame({
+        'SKU编号': sku_ids,
+        '分类': sku_classes,
+        '平均周需求': np.round(mean_demand, 2),
+        '需求标准差': np.round(demand_std, 2),
+        '变异系数': np.round(cv, 3),
+        '预测残差标准差': np.round(sigma, 2),
+        '服务水平': service_level,
+        '安全库存': np.ceil(safety_stock).astype(np.int64),
+        '再订货点': np.ceil(reorder_point).astype(np.int64)
+    })
+
+
+def summarize_by_class(plan):
+    """按ABC分类汇总安全库存和再订货点"""
+    summary = plan.groupby('分类').agg(
+        SKU数量=('SKU编号', 'size'),
+        服务水平=('服务水平', 'first'),
+        平均周需求=('平均周需求', 'sum'),
+        安全库存=('安全库存', 'sum'),
+        再订货点=('再订货点', 'sum'),
+        平均变异系数=('变异系数', 'mean')
+    ).reindex(SKU_CLASSES).dropna(how='all').reset_index()
+    summary['平均变异系数'] = summary['平均变异系数'].round(3)
+    summary['平均周需求'] = summary['平均周需求'].round(2)
+    return summary
+
+
+def build_inventory_plan(df, residuals_store=None, **kwargs):
+    """由明细数据计算全部SKU的库存计划"""
+    sku_ids, weeks, demand = weekly_demand_matrix(df)
+    classes = sku_abc_class(df).reindex(sku_ids).to_numpy()
+    residuals = model_residuals(residuals_store, sku_ids, weeks) if residuals_store is not None else None
+    return plan_inventory(sku_ids, demand, classes, residuals=residuals, **kwargs)
+
+
+def parse_service_levels(values):
+    """解析形如 A=0.98 的服务水平参数"""
+    levels = {}
+    for value in values or []:
+        class_name, _, level = value.partition('=')
+        class_name = class_name.strip().upper()
+        if class_name not in SKU_CLASSES or not level:
+            raise ValueError(f'服务水平格式应为 A=0.98: {value}')
+        levels[class_name] = float(level)
+    return levels
+
+
+def main(argv=None):
+    """导出全部SKU的安全库存和再订货点"""
+    from order_analysis import load_and_merge_data, EXCEL_FILE
+    from forecast_state import ForecastStateStore, STATE_DIR
+
+    parser = argparse.ArgumentParser(description='计算全部SKU的安全库存和再订货点')
+    parser.add_argument('--excel-file', default=EXCEL_FILE, help='原始订单数据文件')
+    parser.add_argument('--output', default='库存计划.csv', help='导出的CSV文件')
+    parser.add_argument('--lead-time', type=float, default=2.0, help='补货提前期（周）')
+    parser.add_argument('--lead-time-std', type=float, default=0.0, help='补货提前期标准差（周）')
+    parser.add_argument('--service-level', nargs='+', metavar='CLASS=LEVEL',
+                        help='各类SKU服务水平，如 A=0.98 B=0.95 C=0.9')
+    parser.add_argument('--state-dir', default=STATE_DIR, help='SARIMA模型状态目录，有模型的SKU使用模型残差')
+    args = parser.parse_args(argv)
+
+    # 加载数据前先校验参数
+    try:
+        check_lead_time(args.lead_time, args.lead_time_std)
+        service_levels = parse_service_levels(args.service_level)
+    except ValueError as e:
+        parser.error(str(e))
+
+    df = load_and_merge_data(args.excel_file)
+    plan = build_inventory_plan(df, residuals_store=ForecastStateStore(args.state_dir),
+                                lead_time=args.lead_time, lead_time_std=args.lead_time_std,
+                                service_levels=service_levels)
+
+    plan.to_csv(args.output, index=False, encoding='utf-8-sig')
+    print(summarize_by_class(plan))
+    print(f"库存计划已导出到 {args.output}")
+
+
+if __name__ == '__main__':
+    main()
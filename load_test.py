@@ -0,0 +1,239 @@
+import pandas as pd
+import numpy as np
+import argparse
+import json
+import logging
+import random
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+# Web应用压力测试
+# 用合成数据在本地启动Flask应用（或连接已运行的服务），
+# 按设定的并发数和请求比例访问 / 、/data 和 /forecast/<sku_id>，
+# 统计各接口的延迟分位数、吞吐量和错误率，用于比较不同部署方式和缓存改动的效果。
+
+# 默认请求比例：名称 -> 权重
+DEFAULT_MIX = {'index': 2, 'data': 4, 'data_filtered': 3, 'forecast': 1}
+
+
+def make_synthetic_orders(n_orders=20000, n_skus=4000, n_customers=101, year=2024, seed=0):
+    """生成与原始订单表结构相同的合成明细数据（订单编号、SKU编号、订货量、时间、客户编号）"""
+    rng = np.random.default_rng(seed)
+
+    lines = rng.integers(1, 8, n_orders)
+    order_ids = np.repeat(np.arange(1, n_orders + 1), lines)
+    customers = np.repeat(rng.integers(1, n_customers + 1, n_orders), lines)
+
+    # 下单时间集中在8:00-18:00，下午略多
+    days = rng.integers(0, 365, n_orders).astype('timedelta64[D]')
+    minutes = np.clip(rng.normal(13 * 60, 150, n_orders), 8 * 60, 18 * 60 - 1).astype(np.int64).astype('timedelta64[m]')
+    times = np.repeat(np.datetime64(f'{year}-01-01') + days + minutes, lines)
+
+    # SKU销量服从长尾分布；同一订单内SKU不重复（与校验后的真实数据一致），重复的行重新抽取
+    def draw_skus(size):
+        return (rng.zipf(1.3, size) - 1) % n_skus + 1
+
+    skus = draw_skus(len(order_ids))
+    duplicated = pd.Series(order_ids * (n_skus + 1) + skus).duplicated().to_numpy()
+    while duplicated.any():
+        skus[duplicated] = draw_skus(int(duplicated.sum()))
+        duplicated = pd.Series(order_ids * (n_skus + 1) + skus).duplicated().to_numpy()
+
+    return pd.DataFrame({
+        '订单编号': order_ids,
+        'SKU编号': skus,
+        '订货量': rng.integers(1, 60, len(order_ids)),
+        '时间': pd.to_datetime(times),
+        '客户编号': [f'C{c:04d}' for c in customers]
+    })
+
+
+def start_local_server(df, port=0, threaded=True, state_dir=None):
+    """用合成数据在后台线程中启动Flask应用，返回 (服务器, 基础URL)
+
+    数据先经过与正式加载相同的校验，应用只会看到合格数据。
+    """
+    from werkzeug.serving import make_server
+    import app as dashboard
+    from forecast_state import ForecastStateStore
+    from data_validation import validate_chunk
+
+    valid_df, rejected, _ = validate_chunk(df, np.empty(0, dtype=np.int64))
+    if len(rejected):
+        print(f"合成数据中有{len(rejected)}行未通过校验，已剔除")
+    dashboard.global_data = dashboard.prepare_order_data(valid_df)
+    # 预测模型状态写入临时目录，避免污染正式的模型状态
+    dashboard.forecast_store = ForecastStateStore(state_dir or tempfile.mkdtemp(prefix='forecast_state_'))
+
+    # 关闭werkzeug的逐请求日志，避免与统计结果混在一起输出
+    logger = logging.getLogger('werkzeug')
+    previous_level = logger.level
+    logger.setLevel(logging.ERROR)
+
+    server = make_server('127.0.0.1', port, dashboard.app, threaded=threaded)
+    server.previous_log_level = previous_level
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def stop_local_server(server):
+    """停止本地服务并恢复werkzeug日志级别"""
+    server.shutdown()
+    logging.getLogger('werkzeug').setLevel(server.previous_log_level)
+
+
+def build_request_paths(mix, n_requests, sku_ids, customers, seed=0):
+    """按请求比例生成请求路径列表，返回 [(接口名称, 路径)]"""
+    rng = random.Random(seed)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+
+    paths = []
+    for name in rng.choices(names, weights=weights, k=n_requests):
+        if name == 'index':
+            path = '/'
+        elif name == 'data':
+            path = '/data'
+        elif name == 'data_filtered':
+            month_start = rng.randint(1, 12)
+            params = {
+                'month_start': month_start,
+                'month_end': rng.randint(month_start, 12),
+                'order_type': rng.choice(['镇内', '镇外']),
+                'sku_class': rng.choice(['A', 'B', 'C', 'A,B'])
+            }
+            if customers and rng.random() < 0.5:
+                params['customer'] = ','.join(rng.sample(customers, 3))
+            path = '/data?' + urllib.parse.urlencode(params)
+        elif name == 'forecast':
+            path = f'/forecast/{rng.choice(sku_ids)}'
+        else:
+            raise ValueError(f'未知的请求类型: {name}')
+        paths.append((name, path))
+    return paths
+
+
+def timed_request(base_url, name, path, timeout):
+    """发送一个请求，返回 (接口名称, 耗时秒数, 是否成功)"""
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(base_url + path, timeout=timeout) as response:
+            body = response.read()
+            ok = response.status == 200
+            # 业务错误以 {'error': ...} 返回，同样计为失败
+            if ok and response.headers.get_content_type() == 'application/json':
+                ok = 'error' not in json.loads(body)
+    except (urllib.error.URLError, OSError, ValueError):
+        ok = False
+    return name, time.perf_counter() - start, ok
+
+
+def run_load_test(base_url, paths, concurrency=8, timeout=120):
+    """用线程池并发发送请求，返回 (各请求结果列表, 总耗时秒数)"""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda item: timed_request(base_url, item[0], item[1], timeout), paths))
+    return results, time.perf_counter() - start
+
+
+def summarize_results(results, elapsed):
+    """按接口统计请求数、错误率、吞吐量和延迟分位数（毫秒）"""
+    frame = pd.DataFrame(results, columns=['接口', '耗时', '成功'])
+    frame['耗时'] *= 1000
+
+    rows = []
+    for name, group in [('全部', frame)] + list(frame.groupby('接口')):
+        latency = group['耗时'].to_numpy()
+        p50, p90, p95, p99 = np.percentile(latency, [50, 90, 95, 99])
+        rows.append({
+            '接口': name,
+            '请求数': len(group),
+            '错误率(%)': round((~group['成功']).mean() * 100, 2),
+            '吞吐量(次/秒)': round(len(group) / elapsed, 2),
+            '平均(ms)': round(latency.mean(), 1),
+            'P50(ms)': round(p50, 1),
+            'P90(ms)': round(p90, 1),
+            'P95(ms)': round(p95, 1),
+            'P99(ms)': round(p99, 1),
+            '最大(ms)': round(latency.max(), 1)
+        })
+    return pd.DataFrame(rows)
+
+
+def fetch_top_skus(base_url, timeout):
+    """从目标服务的 /data 接口读取A类SKU列表，用于预测请求"""
+    with urllib.request.urlopen(base_url + '/data', timeout=timeout) as response:
+        data = json.loads(response.read())
+    if 'error' in data:
+        raise RuntimeError(f"无法从 {base_url}/data 读取SKU列表: {data['error']}")
+    return data.get('top_skus', [])
+
+
+def parse_mix(value):
+    """解析形如 index=2,data=4,forecast=1 的请求比例"""
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in DEFAULT_MIX or not weight:
+            raise argparse.ArgumentTypeError(f'请求比例格式应为 {",".join(DEFAULT_MIX)}=权重: {item}')
+        mix[name] = float(weight)
+    return mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Web应用压力测试')
+    parser.add_argument('--url', help='已运行服务的地址（如 http://localhost:5000），不指定时用合成数据在本地启动')
+    parser.add_argument('--requests', type=int, default=500, help='请求总数')
+    parser.add_argument('--concurrency', type=int, default=8, help='并发数')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX, help='请求比例，如 index=2,data=4,data_filtered=3,forecast=1')
+    parser.add_argument('--warmup', type=int, default=10, help='正式测试前的预热请求数（不计入统计）')
+    parser.add_argument('--orders', type=int, default=20000, help='合成数据的订单数')
+    parser.add_argument('--single-threaded', action='store_true', help='本地服务以单线程方式运行')
+    parser.add_argument('--forecast-skus', type=int, default=5, help='预测请求随机选取的SKU数量（销量最高的N个）')
+    parser.add_argument('--skus', type=int, nargs='+', help='使用 --url 时预测请求的SKU编号，默认从目标服务的 /data 读取')
+    parser.add_argument('--customers', nargs='+', help='使用 --url 时筛选请求的客户编号，不指定时筛选请求不带客户条件')
+    parser.add_argument('--timeout', type=float, default=120, help='单个请求超时秒数')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    args = parser.parse_args(argv)
+
+    server = None
+    base_url = args.url
+    if base_url is None:
+        df = make_synthetic_orders(args.orders, seed=args.seed)
+        top_skus = df.groupby('SKU编号')['订货量'].sum().nlargest(args.forecast_skus).index.tolist()
+        customers = sorted(df['客户编号'].unique().tolist())
+        server, base_url = start_local_server(df, threaded=not args.single_threaded)
+        print(f"本地服务已启动: {base_url}（{'单线程' if args.single_threaded else '多线程'}，合成数据 {len(df)} 行）")
+    else:
+        # 连接已运行的服务时，SKU和客户编号取自目标服务的数据，不使用合成数据
+        base_url = base_url.rstrip('/')
+        top_skus = args.skus or fetch_top_skus(base_url, args.timeout)[:args.forecast_skus]
+        customers = args.customers or []
+        if not top_skus and args.mix.get('forecast'):
+            parser.error('目标服务没有返回SKU列表，请用 --skus 指定预测请求的SKU编号')
+
+    try:
+        if args.warmup:
+            warmup = build_request_paths(args.mix, args.warmup, top_skus, customers, seed=args.seed + 1)
+            run_load_test(base_url, warmup, args.concurrency, args.timeout)
+
+        paths = build_request_paths(args.mix, args.requests, top_skus, customers, seed=args.seed)
+        results, elapsed = run_load_test(base_url, paths, args.concurrency, args.timeout)
+    finally:
+        if server is not None:
+            stop_local_server(server)
+
+    print(f"\n请求数 {len(results)}，并发 {args.concurrency}，总耗时 {elapsed:.2f}s")
+    with pd.option_context('display.max_columns', None, 'display.width', 200):
+        print(summarize_results(results, elapsed).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
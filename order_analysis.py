@@ -5,33 +5,27 @@ from statsmodels.tsa.statespace.sarimax import SARIMAX
 from statsmodels.tsa.stattools import adfuller
 from statsmodels.graphics.tsaplots import plot_acf, plot_pacf
 import os
+import argparse
+from pipeline import Stage, Pipeline
+import data_validation
+from data_validation import load_validated_orders
+
+EXCEL_FILE = r'c:\Coding\!temp_project\251230_order-analysis\案例-附件1：订单数据.xlsx'
 
 # 设置中文显示
 plt.rcParams['font.sans-serif'] = ['SimHei']
 plt.rcParams['axes.unicode_minus'] = False
 
 # 1. 数据整合与预处理
-def load_and_merge_data():
+def load_and_merge_data(excel_file=EXCEL_FILE):
     """加载并合并12个月的订单数据"""
-    excel_file = r'c:\Coding\!temp_project\251230_order-analysis\案例-附件1：订单数据.xlsx'
-    sheet_names = ['1月', '2月', '3月', '4月', '5月', '6月', '7月', '8月', '9月', '10月', '11月', '12月']
-    
-    # 合并所有月份数据
-    all_data = []
-    for sheet in sheet_names:
-        df = pd.read_excel(excel_file, sheet_name=sheet)
-        all_data.append(df)
-    
-    merged_df = pd.concat(all_data, ignore_index=True)
+    # 分块读取并校验，不合格行写入隔离文件而不是被静默丢弃
+    merged_df, report = load_validated_orders(excel_file)
+    # 记录隔离行数，流程缓存据此判断隔离文件是否应当存在
+    merged_df.attrs['隔离行数'] = report['隔离行数']
     print(f"合并后数据形状: {merged_df.shape}")
     print(f"数据列名: {merged_df.columns.tolist()}")
     
-    # 数据清洗
-    merged_df = merged_df.dropna()
-    merged_df['订单编号'] = merged_df['订单编号'].astype(int)
-    merged_df['SKU编号'] = merged_df['SKU编号'].astype(int)
-    merged_df['订货量'] = merged_df['订货量'].astype(int)
-    
     # 添加时间特征
     merged_df['月份'] = merged_df['时间'].dt.month
     merged_df['季度'] = merged_df['时间'].dt.quarter
@@ -292,33 +286,80 @@ def sarima_forecast(df, sku_id, forecast_weeks=52):
         print(f"模型拟合失败: {e}")
         return None
 
+def forecast_top_sku(df, pareto_result, rank, forecast_weeks=52):
+    """对销量排名第rank的A类SKU进行SARIMA预测，返回SKU编号、预测结果和图表文件"""
+    sku_sales, _ = pareto_result
+    a_sku_list = sku_sales[sku_sales['分类'] == 'A']['SKU编号'].tolist()
+    if rank >= len(a_sku_list):
+        return None
+    sku_id = a_sku_list[rank]
+    forecast = sarima_forecast(df, sku_id, forecast_weeks)
+    return {
+        'SKU编号': sku_id,
+        '预测': forecast,
+        # 拟合失败时不生成图表
+        '图表': f'SARIMA预测_SKU_{sku_id}.png' if forecast is not None else None
+    }
+
+def load_outputs(df):
+    """数据加载阶段生成的隔离文件（没有不合格行时不生成）"""
+    return [data_validation.QUARANTINE_FILE] if df.attrs.get('隔离行数') else []
+
+def forecast_outputs(result):
+    """SARIMA预测阶段生成的图表文件"""
+    return [result['图表']] if result and result['图表'] else []
+
+# 分析流程定义
+def build_pipeline(excel_file=EXCEL_FILE, forecast_skus=3, forecast_weeks=52, cache_dir='.pipeline_cache', max_workers=None):
+    """构建分析流程：各阶段声明输入和参数，输出按内容哈希缓存"""
+    stages = [
+        # 1. 数据加载与合并
+        Stage('load', load_and_merge_data, params={'excel_file': excel_file}, files=[excel_file],
+              outputs=load_outputs, code_deps=[data_validation]),
+        # 2. 季节性销售分析
+        Stage('seasonal', seasonal_analysis, inputs=['load'], outputs=['季节性销售分析.png']),
+        # 3. 客户下单规律分析
+        Stage('customer_patterns', customer_order_patterns, inputs=['load'], outputs=['客户下单规律分析.png']),
+        # 4. 累托法则分析
+        Stage('pareto', pareto_analysis, inputs=['load'], outputs=['累托法则分析.png']),
+        # 5. EIQ分析
+        Stage('eiq', eiq_analysis, inputs=['load'], outputs=['EIQ分析.png']),
+    ]
+    
+    # 6. SARIMA销售预测 - 选择前N个A类SKU进行预测，每个SKU一个独立阶段
+    for rank in range(forecast_skus):
+        stages.append(Stage(f'sarima_{rank + 1}', forecast_top_sku, inputs=['load', 'pareto'],
+                            params={'rank': rank, 'forecast_weeks': forecast_weeks},
+                            outputs=forecast_outputs, code_deps=[sarima_forecast]))
+    
+    return Pipeline(stages, cache_dir=cache_dir, max_workers=max_workers)
+
 # 主函数
-def main():
+def main(argv=None):
     """主函数"""
-    print("=== F布行出库效率提升解决方案 ===")
-    
-    # 1. 数据加载与合并
-    df = load_and_merge_data()
-    
-    # 2. 季节性销售分析
-    monthly_sales, quarterly_sales = seasonal_analysis(df)
+    parser = argparse.ArgumentParser(description='F布行出库效率提升分析')
+    parser.add_argument('--only', nargs='+', metavar='STAGE', help='只运行指定阶段（及其所需的上游阶段）')
+    parser.add_argument('--force', nargs='*', metavar='STAGE', help='忽略缓存强制重算指定阶段，不指定阶段时全部重算')
+    parser.add_argument('--excel-file', default=EXCEL_FILE, help='原始订单数据文件')
+    parser.add_argument('--forecast-skus', type=int, default=3, help='进行SARIMA预测的A类SKU数量')
+    parser.add_argument('--forecast-weeks', type=int, default=52, help='预测周数')
+    parser.add_argument('--cache-dir', default='.pipeline_cache', help='阶段输出缓存目录')
+    parser.add_argument('--workers', type=int, default=None, help='并行执行的最大进程数')
+    args = parser.parse_args(argv)
     
-    # 3. 客户下单规律分析
-    customer_order_count, hourly_orders = customer_order_patterns(df)
-    
-    # 4. 累托法则分析
-    sku_sales, customer_sales = pareto_analysis(df)
+    print("=== F布行出库效率提升解决方案 ===")
     
-    # 5. EIQ分析
-    order_quantity, order_sku_count, sku_avg_quantity = eiq_analysis(df)
+    pipeline = build_pipeline(args.excel_file, args.forecast_skus, args.forecast_weeks, args.cache_dir, args.workers)
     
-    # 6. SARIMA销售预测 - 选择前3个A类SKU进行预测
-    a_sku_list = sku_sales[sku_sales['分类'] == 'A']['SKU编号'].head(3).tolist()
-    for sku_id in a_sku_list:
-        sarima_forecast(df, sku_id)
+    # --force 不带参数表示全部强制重算
+    force = True if args.force == [] else args.force
+    try:
+        pipeline.run(targets=args.only, force=force)
+    except ValueError as e:
+        parser.error(str(e))
     
     print("\n=== 分析完成 ===")
     print("所有分析结果和图表已保存到当前目录")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
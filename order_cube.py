@@ -0,0 +1,164 @@
+import pandas as pd
+import numpy as np
+
+# 订单立方体（预聚合）
+# 维度：日期/小时 × 客户 × SKU分类 × 订单类型
+# 度量：订货量合计、订单行数；去重订单数通过订单键表（每个订单一行 + SKU分类掩码）计算
+
+SKU_CLASSES = ['A', 'B', 'C']
+ORDER_TYPES = ['镇内', '镇外']
+
+
+def sku_abc_class(df, a_threshold=0.2, b_threshold=0.5):
+    """按累托法则计算每个SKU的A/B/C分类，返回以SKU编号为索引的Series"""
+    sku_sales = df.groupby('SKU编号')['订货量'].sum().sort_values(ascending=False)
+    total_sku = len(sku_sales)
+
+    # 与pareto_analysis保持一致：前20%为A类，20%-50%为B类，其余为C类
+    rank = np.arange(total_sku)
+    classes = np.where(rank < int(total_sku * a_threshold), 'A',
+                       np.where(rank <= int(total_sku * b_threshold), 'B', 'C'))
+    return pd.Series(classes, index=sku_sales.index, name='分类')
+
+
+def order_type_of(customers):
+    """根据客户编号识别订单类型：C0001-C0050为镇内客户，其余为镇外客户"""
+    customer_no = customers.astype(str).str[1:].astype(int)
+    return pd.Series(np.where(customer_no <= 50, '镇内', '镇外'), index=customers.index)
+
+
+def dataset_version(df):
+    """根据数据内容计算数据集版本号，用于判断立方体是否需要重建"""
+    columns = ['订单编号', 'SKU编号', '订货量', '客户编号', '时间']
+    digest = pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+    return f'{len(df)}-{int(digest.sum(dtype=np.uint64)):016x}'
+
+
+class OrderCube:
+    """预聚合订单立方体，按筛选条件快速回答仪表盘查询"""
+
+    def __init__(self, cells, orders, version, source=None):
+        self.cells = cells
+        self.orders = orders
+        self.version = version
+        # 构建立方体所用的明细数据，用于判断数据集是否已被替换
+        self.source = source
+        self.customers = cells['客户编号'].cat.categories.tolist()
+
+    def query(self, month_start=None, month_end=None, customers=None, order_type=None, sku_classes=None):
+        """按月份范围、客户、订单类型、SKU分类筛选，返回季节性、小时分布等统计"""
+        cells = self.cells
+        orders = self.orders
+
+        cell_mask = np.ones(len(cells), dtype=bool)
+        order_mask = np.ones(len(orders), dtype=bool)
+
+        if month_start is not None:
+            cell_mask &= cells['月份'].to_numpy() >= month_start
+            order_mask &= orders['月份'].to_numpy() >= month_start
+        if month_end is not None:
+            cell_mask &= cells['月份'].to_numpy() <= month_end
+            order_mask &= orders['月份'].to_numpy() <= month_end
+        if customers:
+            cell_mask &= cells['客户编号'].isin(customers).to_numpy()
+            order_mask &= orders['客户编号'].isin(customers).to_numpy()
+        if order_type is not None:
+            cell_mask &= (cells['订单类型'] == order_type).to_numpy()
+            order_mask &= (orders['订单类型'] == order_type).to_numpy()
+        if sku_classes:
+            cell_mask &= cells['SKU分类'].isin(sku_classes).to_numpy()
+            # 订单只要包含任一所选分类的SKU即计入
+            bits = sum(1 << SKU_CLASSES.index(c) for c in sku_classes)
+            order_mask &= (orders['分类掩码'].to_numpy() & bits) != 0
+
+        selected = cells[cell_mask]
+        quantity = selected['订货量'].to_numpy()
+
+        # 1. 季节性销售
+        monthly_qty = np.bincount(selected['月份'].to_numpy(), weights=quantity, minlength=13)
+        monthly_lines = np.bincount(selected['月份'].to_numpy(), weights=selected['行数'].to_numpy(), minlength=13)
+        months = np.flatnonzero(monthly_lines[1:]) + 1
+        monthly_sales = {
+            '月份': months.tolist(),
+            '订货量': [int(x) for x in monthly_qty[months]]
+        }
+
+        quarterly_qty = np.bincount(selected['季度'].to_numpy(), weights=quantity, minlength=5)
+        quarterly_lines = np.bincount(selected['季度'].to_numpy(), weights=selected['行数'].to_numpy(), minlength=5)
+        quarters = np.flatnonzero(quarterly_lines[1:]) + 1
+        quarterly_sales = {
+            '季度': quarters.tolist(),
+            '订货量': [int(x) for x in quarterly_qty[quarters]]
+        }
+
+        # 2. 小时订单分布（去重订单数）
+        matched = orders[order_mask]
+        order_hours = matched[['订单编号', '小时']].drop_duplicates()
+        hourly_count = np.bincount(order_hours['小时'].to_numpy(), minlength=24)
+        hours = np.flatnonzero(hourly_count)
+        hourly_orders = {
+            '小时': hours.tolist(),
+            '订单数': hourly_count[hours].tolist()
+        }
+
+        # 3. 订单类型汇总
+        type_qty = selected.groupby('订单类型', observed=False)['订货量'].sum()
+        order_type_sales = {
+            '订单类型': type_qty.index.astype(str).tolist(),
+            '订货量': [int(x) for x in type_qty.tolist()]
+        }
+
+        return {
+            'version': self.version,
+            'monthly_sales': monthly_sales,
+            'quarterly_sales': quarterly_sales,
+            'hourly_orders': hourly_orders,
+            'order_type_sales': order_type_sales,
+            'total_quantity': int(quantity.sum()),
+            'total_lines': int(selected['行数'].sum()),
+            'total_orders': int(matched['订单编号'].nunique())
+        }
+
+
+def build_order_cube(df, version=None):
+    """由明细数据构建订单立方体（每个数据集版本只需构建一次），version 缺省时由数据内容计算"""
+    data = pd.DataFrame({
+        '订单编号': df['订单编号'].to_numpy(),
+        '日期': df['时间'].dt.normalize().to_numpy(),
+        '小时': df['时间'].dt.hour.to_numpy(),
+        '客户编号': pd.Categorical(df['客户编号'].astype(str)),
+        '订货量': df['订货量'].to_numpy()
+    })
+    if '订单类型' in df.columns:
+        data['订单类型'] = df['订单类型'].to_numpy()
+    else:
+        data['订单类型'] = order_type_of(df['客户编号']).to_numpy()
+    data['订单类型'] = pd.Categorical(data['订单类型'], categories=ORDER_TYPES)
+
+    classes = sku_abc_class(df)
+    data['SKU分类'] = pd.Categorical(df['SKU编号'].map(classes).to_numpy(), categories=SKU_CLASSES)
+
+    # 度量立方体：合计订货量和订单行数
+    keys = ['日期', '小时', '客户编号', 'SKU分类', '订单类型']
+    cells = data.groupby(keys, observed=True).agg(
+        订货量=('订货量', 'sum'),
+        行数=('订货量', 'size')
+    ).reset_index()
+
+    # 去重订单草图：每个(订单, 日期, 小时, 客户)一行，记录其包含的SKU分类位掩码
+    class_codes = data['SKU分类'].cat.codes.to_numpy()
+    flags = [f'含{c}类' for c in SKU_CLASSES]
+    for bit, flag in enumerate(flags):
+        data[flag] = (class_codes == bit).astype(np.uint8)
+    orders = data.groupby(['订单编号', '日期', '小时', '客户编号', '订单类型'], observed=True)[flags] \
+        .max().reset_index()
+    orders['分类掩码'] = np.zeros(len(orders), dtype=np.uint8)
+    for bit, flag in enumerate(flags):
+        orders['分类掩码'] |= orders.pop(flag).to_numpy() << bit
+
+    for table in (cells, orders):
+        table['月份'] = table['日期'].dt.month.astype(np.int64)
+        table['季度'] = table['日期'].dt.quarter.astype(np.int64)
+        table['小时'] = table['小时'].astype(np.int64)
+
+    return OrderCube(cells, orders, version or dataset_version(df), source=df)
@@ -0,0 +1,185 @@
+import hashlib
+import inspect
+import json
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+# 带依赖追踪和磁盘缓存的分析流程执行器
+# 每个阶段声明其输入（上游阶段和外部文件）与参数，
+# 输出按“输入内容哈希 + 参数 + 代码”的键缓存到磁盘，重跑时只重新计算失效的阶段。
+
+
+class Stage:
+    """流程中的一个阶段"""
+
+    def __init__(self, name, func, inputs=(), params=None, files=(), outputs=(), code_deps=()):
+        self.name = name
+        self.func = func
+        # 上游阶段名称，其输出按顺序作为位置参数传给func
+        self.inputs = tuple(inputs)
+        # 关键字参数，参数变化会使缓存失效
+        self.params = dict(params or {})
+        # 依赖的外部文件，文件内容变化会使缓存失效
+        self.files = tuple(files)
+        # 阶段生成的文件（如图表），文件缺失时重新计算；
+        # 文件名取决于计算结果时，传入以阶段输出为参数、返回文件列表的函数
+        self.outputs = outputs if callable(outputs) else tuple(outputs)
+        # func 调用的其他函数或模块，其代码变化同样使缓存失效
+        self.code_deps = tuple(code_deps)
+
+
+def source_of(obj):
+    """获取函数或模块的源代码，无法获取时使用其名称"""
+    try:
+        return inspect.getsource(obj)
+    except (OSError, TypeError):
+        return getattr(obj, '__qualname__', getattr(obj, '__name__', repr(obj)))
+
+
+def file_digest(path):
+    """计算文件内容的哈希值"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def run_stage(func, args, params):
+    """在工作进程中执行阶段函数"""
+    return func(*args, **params)
+
+
+class Pipeline:
+    """按依赖关系执行各阶段，相互独立的阶段并行执行"""
+
+    def __init__(self, stages, cache_dir='.pipeline_cache', max_workers=None):
+        self.stages = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f'阶段名称重复: {stage.name}')
+            self.stages[stage.name] = stage
+        for stage in stages:
+            for dep in stage.inputs:
+                if dep not in self.stages:
+                    raise ValueError(f'阶段 {stage.name} 依赖未知阶段: {dep}')
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+
+    def _topological_order(self, targets):
+        """返回目标阶段及其全部上游阶段的拓扑顺序"""
+        order = []
+        state = {}
+
+        def visit(name):
+            if state.get(name) == 'done':
+                return
+            if state.get(name) == 'visiting':
+                raise ValueError(f'阶段依赖存在环: {name}')
+            state[name] = 'visiting'
+            for dep in self.stages[name].inputs:
+                visit(dep)
+            state[name] = 'done'
+            order.append(name)
+
+        for name in targets:
+            if name not in self.stages:
+                raise ValueError(f'未知阶段: {name}')
+            visit(name)
+        return order
+
+    def _stage_keys(self, order):
+        """计算各阶段的缓存键：上游键 + 参数 + 外部文件内容 + 函数及其依赖的代码"""
+        keys = {}
+        for name in order:
+            stage = self.stages[name]
+            source = [source_of(obj) for obj in (stage.func,) + stage.code_deps]
+            payload = json.dumps({
+                'name': name,
+                'inputs': [keys[dep] for dep in stage.inputs],
+                'params': stage.params,
+                'files': [file_digest(path) for path in stage.files],
+                'code': source
+            }, sort_keys=True, ensure_ascii=False, default=repr)
+            keys[name] = hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+        return keys
+
+    def _cache_path(self, name, key):
+        return os.path.join(self.cache_dir, f'{name}-{key}.pkl')
+
+    def _is_cached(self, name, key):
+        stage = self.stages[name]
+        if not os.path.exists(self._cache_path(name, key)):
+            return False
+        outputs = stage.outputs(self._load(name, key)) if callable(stage.outputs) else stage.outputs
+        return all(os.path.exists(path) for path in outputs)
+
+    def _load(self, name, key):
+        with open(self._cache_path(name, key), 'rb') as f:
+            return pickle.load(f)
+
+    def _store(self, name, key, value):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._cache_path(name, key)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def run(self, targets=None, force=None):
+        """执行目标阶段（默认全部），force为需要强制重算的阶段集合，True表示全部强制重算
+
+        返回 {阶段名称: 输出} 字典，只包含目标阶段。
+        """
+        if targets is None:
+            targets = list(self.stages)
+        order = self._topological_order(targets)
+        keys = self._stage_keys(order)
+
+        if force is True:
+            force = set(order)
+        force = set(force or ())
+        unknown = force - set(self.stages)
+        if unknown:
+            raise ValueError(f'未知阶段: {", ".join(sorted(unknown))}')
+        outside = force - set(order)
+        if outside:
+            raise ValueError(f'强制重算的阶段不在本次运行范围内: {", ".join(sorted(outside))}')
+
+        # 先确定需要重新计算的阶段：未命中缓存或被强制重算
+        stale = {name for name in order if name in force or not self._is_cached(name, keys[name])}
+        for name in order:
+            if name not in stale:
+                print(f"[pipeline] {name}: 使用缓存 ({keys[name]})")
+
+        values = {}
+
+        def value_of(name):
+            if name not in values:
+                values[name] = self._load(name, keys[name])
+            return values[name]
+
+        pending = [name for name in order if name in stale]
+        running = {}
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                # 提交所有上游已就绪的阶段
+                for name in list(pending):
+                    stage = self.stages[name]
+                    if any(dep in pending or dep in running.values() for dep in stage.inputs):
+                        continue
+                    pending.remove(name)
+                    print(f"[pipeline] {name}: 开始计算 ({keys[name]})")
+                    args = [value_of(dep) for dep in stage.inputs]
+                    future = executor.submit(run_stage, stage.func, args, stage.params)
+                    running[future] = name
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    values[name] = future.result()
+                    self._store(name, keys[name], values[name])
+                    print(f"[pipeline] {name}: 完成")
+
+        return {name: value_of(name) for name in targets}
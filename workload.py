@@ -0,0 +1,127 @@
+import pandas as pd
+import numpy as np
+from order_cube import order_type_of, ORDER_TYPES
+
+# 拣货工作量矩阵与人力排班
+# 一次向量化（np.bincount）把明细累加成 订单类型 × 日期 × 小时 的订单数、订单行数、件数矩阵，
+# 再按星期几汇总成 7 × 24 的热力图矩阵，并根据拣货效率假设推算每个时段所需的拣货人数。
+
+WEEKDAYS = ['周一', '周二', '周三', '周四', '周五', '周六', '周日']
+
+# 默认效率假设：每名拣货员每小时拣60行或600件，计划利用率85%
+LINES_PER_PICKER_HOUR = 60
+UNITS_PER_PICKER_HOUR = 600
+UTILIZATION = 0.85
+
+
+def workload_matrices(df):
+    """构建 订单类型 × 日期 × 小时 的订单数、订单行数、件数矩阵
+
+    返回 {'dates': 日期索引, 'orders': 矩阵, 'lines': 矩阵, 'units': 矩阵}，矩阵形状为 (2, 天数, 24)，
+    第一维依次为镇内、镇外。
+    """
+    dates = df['时间'].dt.normalize()
+    first_date = dates.min()
+    n_days = int((dates.max() - first_date).days) + 1
+    day_codes = ((dates - first_date) // pd.Timedelta(days=1)).to_numpy(dtype=np.int64)
+    hours = df['时间'].dt.hour.to_numpy(dtype=np.int64)
+
+    order_types = df['订单类型'] if '订单类型' in df.columns else order_type_of(df['客户编号'])
+    type_codes = pd.Categorical(order_types, categories=ORDER_TYPES).codes.astype(np.int64)
+
+    # 每行明细对应的扁平化格子编号
+    size = len(ORDER_TYPES) * n_days * 24
+    cells = (type_codes * n_days + day_codes) * 24 + hours
+
+    lines = np.bincount(cells, minlength=size)
+    units = np.bincount(cells, weights=df['订货量'].to_numpy(dtype=np.float64), minlength=size)
+
+    # 订单数：同一订单在同一格子中只计一次
+    order_cells = np.unique(df['订单编号'].to_numpy(dtype=np.int64) * size + cells) % size
+    orders = np.bincount(order_cells, minlength=size)
+
+    shape = (len(ORDER_TYPES), n_days, 24)
+    return {
+        'dates': pd.date_range(first_date, periods=n_days, freq='D'),
+        'orders': orders.reshape(shape),
+        'lines': lines.reshape(shape),
+        'units': units.reshape(shape)
+    }
+
+
+def weekday_profile(matrices, stat='mean', order_type=None):
+    """按星期几汇总成 7 × 24 矩阵
+
+    stat 为 mean（工作日平均）、p90（90分位）或 max（峰值）；只统计当天有订单的日期，避免休息日拉低平均值。
+    order_type 为 None 时合并镇内和镇外。
+    """
+    if stat not in ('mean', 'p90', 'max'):
+        raise ValueError(f'stat 必须是 mean/p90/max: {stat}')
+
+    if order_type is None:
+        selected = {name: matrices[name].sum(axis=0) for name in ('orders', 'lines', 'units')}
+    else:
+        index = ORDER_TYPES.index(order_type)
+        selected = {name: matrices[name][index] for name in ('orders', 'lines', 'units')}
+
+    # 只统计有订单的日期（按合并后的订单行判断）
+    working = matrices['lines'].sum(axis=(0, 2)) > 0
+    weekdays = matrices['dates'].dayofweek.to_numpy()
+
+    profile = {}
+    for name, values in selected.items():
+        result = np.zeros((7, 24))
+        for day in range(7):
+            rows = values[working & (weekdays == day)]
+            if len(rows) == 0:
+                continue
+            if stat == 'mean':
+                result[day] = rows.mean(axis=0)
+            elif stat == 'p90':
+                result[day] = np.percentile(rows, 90, axis=0)
+            else:
+                result[day] = rows.max(axis=0)
+        profile[name] = result
+    profile['working_days'] = np.bincount(weekdays[working], minlength=7)
+    return profile
+
+
+def required_pickers(lines, units, lines_per_picker_hour=LINES_PER_PICKER_HOUR,
+                     units_per_picker_hour=UNITS_PER_PICKER_HOUR, utilization=UTILIZATION):
+    """根据每小时订单行数和件数推算所需拣货人数（取两种效率约束中较大者）"""
+    # 用 not (x > 0) 的写法，NaN 同样判为非法
+    if not (lines_per_picker_hour > 0 and units_per_picker_hour > 0 and 0 < utilization <= 1) \
+            or not np.isfinite([lines_per_picker_hour, units_per_picker_hour]).all():
+        raise ValueError('拣货效率必须是大于0的有限数，利用率必须在0和1之间')
+    workload = np.maximum(lines / lines_per_picker_hour, units / units_per_picker_hour)
+    return np.ceil(workload / utilization).astype(np.int64)
+
+
+def staffing_plan(matrices, stat='mean', split=False, **assumptions):
+    """生成热力图数据：星期几 × 小时的订单数、订单行数、件数和所需拣货人数"""
+    def build(order_type):
+        profile = weekday_profile(matrices, stat, order_type)
+        return {
+            'orders': np.round(profile['orders'], 2),
+            'lines': np.round(profile['lines'], 2),
+            'units': np.round(profile['units'], 2),
+            'pickers': required_pickers(profile['lines'], profile['units'], **assumptions),
+            'working_days': profile['working_days']
+        }
+
+    total = build(None)
+    peak_day, peak_hour = np.unravel_index(np.argmax(total['pickers']), total['pickers'].shape)
+    result = {
+        'days': WEEKDAYS,
+        'hours': list(range(24)),
+        'stat': stat,
+        **total,
+        'peak': {
+            'day': WEEKDAYS[peak_day],
+            'hour': int(peak_hour),
+            'pickers': int(total['pickers'][peak_day, peak_hour])
+        }
+    }
+    if split:
+        result['by_order_type'] = {order_type: build(order_type) for order_type in ORDER_TYPES}
+    return result